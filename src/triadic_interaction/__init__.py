@@ -23,7 +23,10 @@ from triadic_interaction.visualization import (
     plot_pdf,
     plot_covariance,
     plot_conditional_correlation,
-    plot_conditional_mutual_information
+    plot_conditional_mutual_information,
+    batch_plotting,
+    figure_to_array,
+    plot_parallel
 )
 
 __all__ = [
@@ -49,6 +52,9 @@ __all__ = [
     'plot_covariance',
     'plot_conditional_correlation',
     'plot_conditional_mutual_information',
+    'batch_plotting',
+    'figure_to_array',
+    'plot_parallel',
 ]
 
 """End of file."""
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""
+Reductions module.
+
+This module contains reductions over the sample axis used by the visualization module.
+The reductions are compiled with numba if it is installed, and fall back to numpy otherwise.
+"""
+
+# Import necessary packages
+import numpy as np
+
+# Import numba if available
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(cache=True)
+    def _mean_std(x):
+        """Compute the mean and standard deviation along axis 1 in two sweeps per row."""
+        n_rows, n_cols = x.shape
+        mean = np.empty(n_rows)
+        std = np.empty(n_rows)
+        for i in range(n_rows):
+            # Return NaN without samples as numpy does
+            if n_cols == 0:
+                mean[i] = np.nan
+                std[i] = np.nan
+                continue
+            acc = 0.
+            for j in range(n_cols):
+                acc += x[i, j]
+            mu = acc / n_cols
+            var = 0.
+            for j in range(n_cols):
+                d = x[i, j] - mu
+                var += d * d
+            mean[i] = mu
+            std[i] = np.sqrt(var / n_cols)
+        return mean, std
+
+    @njit(cache=True)
+    def _nanmean(x):
+        """Compute the mean along axis 1 ignoring NaNs in a single sweep per row."""
+        n_rows, n_cols = x.shape
+        mean = np.empty(n_rows)
+        for i in range(n_rows):
+            acc = 0.
+            count = 0
+            for j in range(n_cols):
+                v = x[i, j]
+                if v == v:
+                    acc += v
+                    count += 1
+            mean[i] = acc / count if count else np.nan
+        return mean
+else:
+    def _mean_std(x):
+        """Compute the mean and standard deviation along axis 1."""
+        return x.mean(axis=1), x.std(axis=1)
+
+    def _nanmean(x):
+        """Compute the mean along axis 1 ignoring NaNs."""
+        return np.nanmean(x, axis=1)
+
+def mean_std(x:np.ndarray):
+    """Compute the mean and standard deviation over samples.
+
+    Parameters
+    ----------
+    x : numpy.ndarray of shape (n_bins, n_samples)
+        The data.
+
+    Returns
+    -------
+    mean : numpy.ndarray of shape (n_bins,)
+        The mean over samples.
+    std : numpy.ndarray of shape (n_bins,)
+        The (population) standard deviation over samples.
+    """
+    return _mean_std(np.ascontiguousarray(x, dtype=np.float64))
+
+def nanmean(x:np.ndarray):
+    """Compute the mean over samples ignoring NaNs.
+
+    Parameters
+    ----------
+    x : numpy.ndarray of shape (n_bins, n_samples)
+        The data.
+
+    Returns
+    -------
+    mean : numpy.ndarray of shape (n_bins,)
+        The mean over the non-NaN samples, or NaN if all samples are NaN.
+    """
+    return _nanmean(np.ascontiguousarray(x, dtype=np.float64))
+
+"""End of file"""
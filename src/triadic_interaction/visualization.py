@@ -2,17 +2,37 @@
 Visualization module.
 
 This module contains functions for visualizing the results of the node dynamics with triadic interactions.
+
+Batch plotting mode: set the environment variable NODE_DYNAMICS_BATCH to 1 to select
+the non-interactive Agg backend on import, so that figures are only written to files.
+The backend is left unchanged if matplotlib.pyplot has already been imported,
+e.g. in a notebook. The worker processes of plot_parallel always use the Agg backend.
 """
 
 # Import necessary packages
+import os
+import sys
+import matplotlib
+
+# Use the Agg backend in batch plotting mode unless pyplot already set up a backend
+if os.environ.get('NODE_DYNAMICS_BATCH') == '1' and 'matplotlib.pyplot' not in sys.modules:
+    matplotlib.use('Agg', force=False)
+
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba, to_rgba_array
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import functools
 import types
+from triadic_interaction._reductions import mean_std, nanmean
 
-# Matplotlib configuration
-MPL_CONFIG = {
+# Matplotlib configuration (read-only)
+MPL_CONFIG = types.MappingProxyType({
     # Figure style
     'figure.figsize' : (3, 2.5),        # specify figure size
+    'figure.constrained_layout.use' : True, # specify constrained layout
     # Font style
     'font.size' : 7,                    # specify default font size
     # Axes style
@@ -39,6 +59,10 @@ MPL_CONFIG = {
     # Line style
     'lines.linewidth' : 1.0,            # specify line width
     'lines.markersize' : 3,             # specify marker size
+    # Path style
+    'path.simplify' : True,             # specify path simplification
+    'path.simplify_threshold' : 1.0,    # specify path simplification threshold
+    'agg.path.chunksize' : 10000,       # specify Agg path chunk size
     # Grid style
     'grid.linewidth' : 0.5,             # specify grid line width
     # Legend style
@@ -47,12 +71,250 @@ MPL_CONFIG = {
     'legend.loc' : 'best',              # specify legend position
     'legend.handlelength' : 2.5,        # specify legend handle length
     # Savefig style
-    'savefig.bbox' : 'tight',           # specify savefig bbox
+    'savefig.bbox' : 'standard',        # specify savefig bbox
+    'savefig.dpi' : 150,                # specify savefig resolution
     'savefig.pad_inches' : 0.05,        # specify savefig pad inches
     'savefig.transparent' : True,       # specify savefig transparency
     # Mathtext style
     'mathtext.default' : 'regular',     # specify mathtext font
-}
+    # Text style
+    'text.usetex' : False,              # specify mathtext instead of LaTeX
+})
+
+# Tick labels of the covariance plot
+_COV_LABELS = tuple(r'$\Sigma_{%d%d}$' % (i, j) for i in (1, 2, 3) for j in (1, 2, 3))
+
+# Colors of the violins in the covariance plot as RGBA
+_COV_FACECOLORS = to_rgba_array([
+    '#8c8cd1', '#7fb2e2', '#7bd4d7', 
+    '#7cdd9e', '#92d874', '#b4d645', 
+    '#d5ca47', '#f5b43d', '#f58b33'
+])
+_COV_EDGECOLOR = to_rgba('black')
+
+# Validated MPL_CONFIG to compare with the rcParams
+_MPL_RC = matplotlib.RcParams(MPL_CONFIG)
+
+def _ensure_rc():
+    """Apply MPL_CONFIG to the matplotlib rcParams unless they already match it.
+
+    The rcParams are compared on every call, so that changes made in between,
+    e.g. by plt.rcParams.update in a script, are overridden again.
+    """
+    if any(plt.rcParams[key] != value for key, value in _MPL_RC.items()):
+        plt.rcParams.update(MPL_CONFIG)
+
+# Cache of reusable figures keyed by their layout (only inside batch_plotting)
+_FIG_CACHE = None
+
+@contextlib.contextmanager
+def batch_plotting():
+    """Context manager for producing many figures back-to-back.
+
+    Interactive mode is turned off so that figures are only drawn when saved,
+    and the warning on the number of open figures is silenced.
+    Within the context, the plot functions reuse figures with the same layout,
+    so a returned figure is only valid until the next plot with the same layout.
+    The reused figures are closed and the rcParams are restored on exit.
+
+    Examples
+    --------
+    >>> with batch_plotting():
+    ...     for i, X in enumerate(Xs):
+    ...         plot_timeseries(X, "timeseries_{}.pdf".format(i), t_max)
+    """
+    global _FIG_CACHE
+
+    # Enable the figure cache unless an outer context already did
+    owner = _FIG_CACHE is None
+    if owner:
+        _FIG_CACHE = {}
+
+    try:
+        with plt.ioff(), plt.rc_context({'figure.max_open_warning': 0}):
+            yield
+    finally:
+        # Close the reused figures and disable the figure cache
+        if owner:
+            for fig, _ in _FIG_CACHE.values():
+                plt.close(fig)
+            _FIG_CACHE = None
+
+def figure_to_array(fig):
+    """Render the figure and return its pixels without encoding an image file.
+
+    Parameters
+    ----------
+    fig : matplotlib.figure.Figure
+        The figure, e.g. returned by one of the plot functions.
+
+    Returns
+    -------
+    rgba : numpy.ndarray of shape (height, width, 4)
+        The RGBA pixels (uint8) of the figure.
+        The array shares memory with the canvas, so copy it before the figure is drawn again.
+    """
+    # Draw the figure on its Agg canvas
+    fig.canvas.draw()
+
+    return np.asarray(fig.canvas.buffer_rgba())
+
+def _init_worker():
+    """Select the Agg backend in a worker process of plot_parallel."""
+    plt.switch_backend('Agg')
+
+def _plot_to_file(plot_func, kwargs:dict):
+    """Call the plot function in a worker process, close its figure and return the output file name only."""
+    plt.close(plot_func(**kwargs))
+    return kwargs['output_file']
+
+def plot_parallel(plot_func, arguments:list, max_workers:int=None):
+    """Produce independent figures in parallel processes.
+
+    Parameters
+    ----------
+    plot_func : function
+        One of the plot functions of this module, e.g. plot_covariance.
+    arguments : list of dict
+        The keyword arguments of each call, including output_file.
+        They must be picklable, i.e. arrays, numbers, strings and module-level functions.
+    max_workers : int, optional
+         (Default value = None)
+        The number of processes, passed to concurrent.futures.ProcessPoolExecutor.
+
+    Returns
+    -------
+    output_files : list of str
+        The output file names in the order of the arguments.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as executor:
+        futures = [executor.submit(_plot_to_file, plot_func, kwargs) for kwargs in arguments]
+        return [future.result() for future in futures]
+
+def _get_fig(nrows:int=1, ncols:int=1, **kwargs):
+    """Get a figure and axes with the given layout, reusing a cached one inside batch_plotting.
+
+    Parameters
+    ----------
+    nrows : int, optional
+         (Default value = 1)
+        The number of rows of the subplot grid.
+    ncols : int, optional
+         (Default value = 1)
+        The number of columns of the subplot grid.
+    **kwargs
+        The keyword arguments passed to matplotlib.pyplot.subplots.
+
+    Returns
+    -------
+    fig : matplotlib.figure.Figure
+        The figure.
+    ax : matplotlib.axes.Axes or numpy.ndarray of matplotlib.axes.Axes
+        The cleared axes.
+    """
+    # Create a new figure outside batch_plotting
+    if _FIG_CACHE is None:
+        return plt.subplots(nrows=nrows, ncols=ncols, **kwargs)
+
+    key = (nrows, ncols, tuple(sorted(kwargs.items())))
+
+    # Create the figure if it is not cached yet or has been closed
+    if key not in _FIG_CACHE or not plt.fignum_exists(_FIG_CACHE[key][0].number):
+        _FIG_CACHE[key] = plt.subplots(nrows=nrows, ncols=ncols, **kwargs)
+        return _FIG_CACHE[key]
+
+    # Otherwise clear the axes of the cached figure
+    fig, ax = _FIG_CACHE[key]
+    for a in np.atleast_1d(ax).flat:
+        a.cla()
+
+    return fig, ax
+
+def _savefig(fig, output_file:str):
+    """Save the figure, encoding PNG files with a fast compression level.
+
+    Parameters
+    ----------
+    fig : matplotlib.figure.Figure
+        The figure.
+    output_file : str
+        The output file name.
+    """
+    if str(output_file).lower().endswith('.png'):
+        fig.savefig(output_file, pil_kwargs={'compress_level': 3, 'optimize': False})
+    else:
+        fig.savefig(output_file)
+
+def _decimate(T:np.ndarray, Y:np.ndarray, target:int=2000):
+    """Decimate dense timeseries into min/max envelopes for plotting.
+
+    Parameters
+    ----------
+    T : numpy.ndarray of shape (n_timesteps,)
+        The time span.
+    Y : numpy.ndarray of shape (n_timesteps, ...)
+        The timeseries data.
+    target : int, optional
+         (Default value = 2000)
+        The number of blocks to reduce the timeseries to.
+
+    Returns
+    -------
+    T : numpy.ndarray of shape (n_points,)
+        The decimated time span.
+    Y : numpy.ndarray of shape (n_points, ...)
+        The decimated timeseries data, alternating the min and max of each block.
+    """
+    n_timesteps = len(T)
+
+    # Keep short timeseries as they are
+    if n_timesteps <= 2 * target:
+        return T, Y
+
+    # Pad the timeseries with its last value to fill the last block
+    block = -(-n_timesteps // target)
+    n_blocks = -(-n_timesteps // block)
+    n_pad = n_blocks * block - n_timesteps
+    T_blocks = np.pad(T, (0, n_pad), mode='edge').reshape(n_blocks, block)
+    Y_blocks = np.pad(
+        Y, 
+        [(0, n_pad)] + [(0, 0)] * (Y.ndim - 1), 
+        mode='edge'
+    ).reshape((n_blocks, block) + Y.shape[1:])
+
+    # Trace the min and max of each block
+    T = np.stack([T_blocks[:, 0], T_blocks[:, -1]], axis=1).reshape(2 * n_blocks)
+    Y = np.stack(
+        [Y_blocks.min(axis=1), Y_blocks.max(axis=1)], 
+        axis=1
+    ).reshape((2 * n_blocks,) + Y.shape[1:])
+
+    return T, Y
+
+def _extrema(arrays:list):
+    """Compute the minimum and maximum of each array in a list.
+
+    Parameters
+    ----------
+    arrays : list of numpy.ndarray
+        The arrays.
+
+    Returns
+    -------
+    mins : numpy.ndarray of shape (len(arrays),)
+        The minimum of each array.
+    maxs : numpy.ndarray of shape (len(arrays),)
+        The maximum of each array.
+    """
+    # Reduce all arrays at once if they share the same shape
+    if all(np.shape(a) == np.shape(arrays[0]) for a in arrays):
+        stacked = np.stack(arrays).reshape(len(arrays), -1)
+        return stacked.min(axis=1), stacked.max(axis=1)
+
+    # Otherwise reduce each array without an intermediate list
+    mins = np.fromiter((np.min(a) for a in arrays), dtype=float, count=len(arrays))
+    maxs = np.fromiter((np.max(a) for a in arrays), dtype=float, count=len(arrays))
+    return mins, maxs
 
 def plot_timeseries(X:np.ndarray, output_file:str, t_max:float, n_samples:int=1, separate:bool=False, theory=None):
     """Plot the timeseries.
@@ -81,7 +343,7 @@ def plot_timeseries(X:np.ndarray, output_file:str, t_max:float, n_samples:int=1,
         The figure.
     """
     # Update matplotlib rcParams
-    plt.rcParams.update(MPL_CONFIG)
+    _ensure_rc()
 
     # Get the number of nodes and timesteps
     n_nodes = X.shape[0]
@@ -93,22 +355,34 @@ def plot_timeseries(X:np.ndarray, output_file:str, t_max:float, n_samples:int=1,
     # If not separate, plot all nodes in one figure
     if not separate:
         # Create a figure
-        fig, ax = plt.subplots()
+        fig, ax = _get_fig()
 
-        # Loop over samples
-        for i in range(n_samples):
-            # Loop over nodes
-            for n in range(n_nodes):
-                # Plot the timeseries
-                ax.plot(
-                    T, 
-                    X[n, :, i], 
-                    label="node {}, sample# {}" % (
-                        n+1, 
-                        i+1
-                    ), 
-                    alpha=0.5
-                )
+        # Stack the timeseries into columns ordered by (sample, node)
+        Y = X[:, :, :n_samples].transpose(1, 2, 0).reshape(n_timesteps, n_samples * n_nodes)
+
+        # Decimate the timeseries
+        T_plot, Y = _decimate(T, Y)
+
+        # Add the legend only if it stays readable
+        legend_needed = n_samples * n_nodes <= 12
+
+        # Plot the timeseries
+        if legend_needed:
+            ax.plot(
+                T_plot, 
+                Y, 
+                label=[
+                    "node {}, sample# {}".format(n+1, i+1)
+                    for i in range(n_samples) for n in range(n_nodes)
+                ], 
+                alpha=0.5
+            )
+        else:
+            ax.plot(
+                T_plot, 
+                Y, 
+                alpha=0.5
+            )
 
         # Set the x and y labels
         ax.set_xlabel("$T$")
@@ -118,44 +392,58 @@ def plot_timeseries(X:np.ndarray, output_file:str, t_max:float, n_samples:int=1,
         ax.set_xlim(0, t_max)
 
         # Add the legend
-        ax.legend(
-            loc='center left', 
-            bbox_to_anchor=(1, 0.5), 
-            fontsize=6
-        )
+        if legend_needed:
+            ax.legend(
+                loc='center left', 
+                bbox_to_anchor=(1, 0.5), 
+                fontsize=6
+            )
     
     # If separate, plot each node in a separate figure
     else:
         # Create a figure
-        fig, ax = plt.subplots(
+        fig, ax = _get_fig(
             nrows=n_nodes, 
             ncols=1, 
             figsize=(4, 5), 
             sharex=True
         )
-        # Loop over samples
-        for i in range(n_samples):
-            # Loop over nodes
-            for n in range(n_nodes):
-                # Plot the timeseries
-                ax[n].plot(
-                    T, 
-                    X[n, :, i], 
-                    label="node {}, sample# {}" % (n+1, i+1), 
-                    alpha=0.5
-                )
-                # Set the y labels and x limits
-                ax[n].set_ylabel("$X_{%d}$" % (n+1))
-                ax[n].set_xlim(0, t_max)
-                
+        # Get the line colors from the property cycle
+        cycle = plt.rcParams['axes.prop_cycle'].by_key()['color']
+        colors = [cycle[i % len(cycle)] for i in range(n_samples)]
+
+        # Compute the averages of all nodes of shape (n_nodes, n_timesteps)
+        means = X.mean(axis=2)
+
         # Loop over nodes
         for n in range(n_nodes):
+            # Decimate the timeseries
+            T_plot, Y = _decimate(T, X[n, :, :n_samples])
+
+            # Build the line segments of shape (n_samples, n_points, 2)
+            segments = np.empty((n_samples, len(T_plot), 2))
+            segments[:, :, 0] = T_plot
+            segments[:, :, 1] = Y.T
+
+            # Plot the timeseries of all samples as a single artist
+            ax[n].add_collection(
+                LineCollection(
+                    segments, 
+                    colors=colors, 
+                    linewidths=1.0, 
+                    alpha=0.5
+                )
+            )
+            ax[n].autoscale_view(scalex=False)
+            # Set the y labels and x limits
+            ax[n].set_ylabel("$X_{%d}$" % (n+1))
+            ax[n].set_xlim(0, t_max)
+
             # Plot the average
             ax[n].plot(
-                T, 
-                np.mean(X[n, :, :], axis=1), 
+                *_decimate(T, means[n]), 
                 "k--", 
-                label="node {} average" % (n+1), 
+                label="node {} average".format(n+1), 
                 alpha=0.5
             )
         
@@ -171,11 +459,8 @@ def plot_timeseries(X:np.ndarray, output_file:str, t_max:float, n_samples:int=1,
         # Set the x labels
         ax[-1].set_xlabel("$T$")
 
-    # Apply tight layout
-    fig.tight_layout()
-
     # Save the figure
-    fig.savefig(output_file)
+    _savefig(fig, output_file)
 
     return fig
 
@@ -206,22 +491,24 @@ def plot_pdf(probs:list, bins:list, output_file:str, f_theory=None, logscale:boo
         The figure.
     """
     # Update matplotlib rcParams
-    plt.rcParams.update(MPL_CONFIG)
+    _ensure_rc()
 
     # Get the number of nodes
     n_nodes = len(probs)
 
+    # View the probabilities as arrays of shape (n_bins, n_samples)
+    probs2d = [p[:, None] if p.ndim == 1 else p for p in probs]
+
     # Get the min and max of the bins
-    Xmin = [np.min(bins[i]) for i in range(n_nodes)]
-    Xmax = [np.max(bins[i]) for i in range(n_nodes)]
+    Xmin, Xmax = _extrema(bins)
 
     # Plot the histogram
     if not parallel:
-        x_min = min(Xmin)
-        x_max = max(Xmax)
+        x_min = Xmin.min()
+        x_max = Xmax.max()
 
         # Create the figure
-        fig, ax = plt.subplots()
+        fig, ax = _get_fig()
         
         # Set the labels
         ax.set_xlabel(r'$X_{i}$')
@@ -232,54 +519,48 @@ def plot_pdf(probs:list, bins:list, output_file:str, f_theory=None, logscale:boo
 
         # Loop over nodes
         for i in range(n_nodes):
+            # Compute the mean and standard deviation over samples
+            probs_mean, probs_std = mean_std(probs2d[i])
 
-            if probs[i].ndim == 1:
-                # Plot the histogram
-                ax.scatter(
-                    bins[i], 
-                    probs[i], 
-                    label="X_{%d}" % (i+1),
-                    edgecolors='r',
-                    facecolors='none',
-                    marker='o'
-                )
-            elif probs[i].ndim == 2:
-                # Plot the histogram
-                ax.scatter(
-                    bins[i], 
-                    np.mean(probs[i], axis=1), 
-                    label="X_{%d}" % (i+1),
-                    facecolors='none',
-                    edgecolors='r',
-                    marker='o'
+            # Plot the histogram
+            ax.plot(
+                bins[i], 
+                probs_mean, 
+                label="X_{%d}" % (i+1),
+                markerfacecolor='none',
+                markeredgecolor='r',
+                marker='o',
+                linestyle='none',
+                rasterized=True
+            )
+            if not logscale and probs2d[i].shape[1] > 1:
+                ax.errorbar(
+                    bins[i],
+                    probs_mean,
+                    yerr=probs_std / np.sqrt(probs2d[i].shape[1]),
+                    fmt='none', 
+                    color='r', 
+                    ecolor='r', 
+                    elinewidth=1, 
+                    capsize=2, 
+                    alpha=0.5,
+                    rasterized=True
                 )
-                if not logscale:
-                    ax.errorbar(
-                        bins[i],
-                        np.mean(probs[i], axis=1),
-                        yerr=np.std(probs[i], axis=1) / np.sqrt(probs[i].shape[1]),
-                        fmt='none', 
-                        color='r', 
-                        ecolor='r', 
-                        elinewidth=1, 
-                        capsize=2, 
-                        alpha=0.5
-                    )
         
         # Plot the theory
         if f_theory is not None:
             # Create the x values
-            x_theory = np.linspace(x_min, x_max) # default num points = 50
+            x_theory = np.linspace(x_min, x_max, num=200)
+
+            # Get the theory for all nodes
+            p_theories = [f_theory[i](x_theory) for i in range(n_nodes)]
 
             # Loop over nodes
             for i in range(n_nodes):
-                # Get the theory
-                p_theory = f_theory[i](x_theory)
-
                 # Plot the theory
                 ax.plot(
                     x_theory, 
-                    p_theory, 
+                    p_theories[i], 
                     "--", 
                     label="theory ($X_{%d}$)" % (i+1)
                 )
@@ -291,7 +572,7 @@ def plot_pdf(probs:list, bins:list, output_file:str, f_theory=None, logscale:boo
     # Plot each node separately
     else:
         # Create the figure
-        fig, axs = plt.subplots(
+        fig, axs = _get_fig(
             nrows=1, 
             ncols=n_nodes, 
             sharey=True, 
@@ -301,38 +582,40 @@ def plot_pdf(probs:list, bins:list, output_file:str, f_theory=None, logscale:boo
         # Set the y-axis label
         axs[0].set_ylabel(r'PDF $p^{\rm{st}}(X_{i})$')
 
+        # Get the theory for all nodes
+        if f_theory is not None:
+            # Create the x values of all nodes in a single allocation
+            x_theories = Xmin[:, None] + (Xmax - Xmin)[:, None] * np.linspace(0., 1., num=100)
+            p_theories = [f_theory[i](x_theories[i]) for i in range(n_nodes)]
+
         # Loop over nodes
         for i in range(n_nodes):
-            if probs[i].ndim == 1 or \
-                (probs[i].ndim == 2 and probs[i].shape[1] == 1):
-                # Plot the histogram
-                axs[i].scatter(
-                    bins[i],
-                    probs[i],
-                    edgecolors='r',
-                    facecolors='none',
-                    marker='o'
-                )
-            elif probs[i].ndim == 2:
-                # Plot the histogram
-                axs[i].scatter(
-                    bins[i], 
-                    np.mean(probs[i], axis=1),
-                    facecolors='none',
-                    edgecolors='r',
-                    marker='o',
-                )
+            # Compute the mean and standard deviation over samples
+            probs_mean, probs_std = mean_std(probs2d[i])
+
+            # Plot the histogram
+            axs[i].plot(
+                bins[i], 
+                probs_mean,
+                markerfacecolor='none',
+                markeredgecolor='r',
+                marker='o',
+                linestyle='none',
+                rasterized=True,
+            )
 
+            if probs2d[i].shape[1] > 1:
                 axs[i].errorbar(
                     bins[i],
-                    np.mean(probs[i], axis=1),
-                    yerr=np.std(probs[i], axis=1) / np.sqrt(probs[i].shape[1]),
+                    probs_mean,
+                    yerr=probs_std / np.sqrt(probs2d[i].shape[1]),
                     fmt='none', 
                     color='r', 
                     ecolor='r', 
                     elinewidth=1, 
                     capsize=2, 
-                    alpha=0.5
+                    alpha=0.5,
+                    rasterized=True
                 )
 
             # Set the x-axis
@@ -348,16 +631,10 @@ def plot_pdf(probs:list, bins:list, output_file:str, f_theory=None, logscale:boo
         
             # Plot the theory
             if f_theory is not None:
-                # Create the x values
-                x_theory = np.linspace(Xmin[i], Xmax[i], num=100)
-
-                # Get the theory
-                p_theory = f_theory[i](x_theory)
-
                 # Plot the theory
                 axs[i].plot(
-                    x_theory, 
-                    p_theory, 
+                    x_theories[i], 
+                    p_theories[i], 
                     "k--", 
                     label='no TI'
                 )
@@ -365,11 +642,8 @@ def plot_pdf(probs:list, bins:list, output_file:str, f_theory=None, logscale:boo
                 # Set the legend
                 axs[i].legend()
         
-    # Set the layout
-    fig.tight_layout()
-
     # Save the figure
-    fig.savefig(output_file)
+    _savefig(fig, output_file)
 
     return fig
 
@@ -391,20 +665,11 @@ def plot_covariance(cov:np.ndarray, output_file:str, theory=None):
     fig : matplotlib.figure.Figure
         The figure.
     """
-    # Set the labels
-    labels = [
-        '$\Sigma_{11}$', '$\Sigma_{12}$', '$\Sigma_{13}$',
-        '$\Sigma_{21}$', '$\Sigma_{22}$', '$\Sigma_{23}$',
-        '$\Sigma_{31}$', '$\Sigma_{32}$', '$\Sigma_{33}$'
-    ]
-
     # Set the style of the plot
-    plt.rcParams.update(
-        MPL_CONFIG
-    )
+    _ensure_rc()
 
     # Create a figure
-    fig, ax = plt.subplots()
+    fig, ax = _get_fig()
     
     # Create violin plots for each categorical data
     parts = ax.violinplot(
@@ -414,19 +679,11 @@ def plot_covariance(cov:np.ndarray, output_file:str, theory=None):
         showextrema=False
     )
 
-    # Customize the style of violin plots
-    colors = [
-        '#8c8cd1', '#7fb2e2', '#7bd4d7', 
-        '#7cdd9e', '#92d874', '#b4d645', 
-        '#d5ca47', '#f5b43d', '#f58b33'
-    ]
-    linewidths = [0.5] * 9
-
     # Set the color of each violin
     for i, pc in enumerate(parts['bodies']):
-        pc.set_facecolor(colors[i])
-        pc.set_edgecolor('black')
-        pc.set_linewidths(linewidths[i])
+        pc.set_facecolor(_COV_FACECOLORS[i])
+        pc.set_edgecolor(_COV_EDGECOLOR)
+        pc.set_linewidth(0.5)
 
     # Mean
     mean = np.mean(
@@ -434,20 +691,10 @@ def plot_covariance(cov:np.ndarray, output_file:str, theory=None):
         axis=0
     )
 
-    # 25th, 50th, and 75th percentiles
-    quartile1, medians, quartile3 = np.percentile(
-        cov, 
-        [25, 50, 75], 
-        axis=0
-    )
-    
-    # Min and max whiskers
-    whiskers_min = np.min(
-        cov, 
-        axis=0
-    )
-    whiskers_max = np.max(
+    # Min, 25th, 50th, and 75th percentiles, and max in a single pass
+    whiskers_min, quartile1, medians, quartile3, whiskers_max = np.percentile(
         cov, 
+        [0, 25, 50, 75, 100], 
         axis=0
     )
     
@@ -455,40 +702,34 @@ def plot_covariance(cov:np.ndarray, output_file:str, theory=None):
     inds = np.arange(1, len(medians) + 1)
     
     # Plot the mean
-    ax.scatter(
+    ax.plot(
         inds, mean, 
         marker='.', 
-        s=4, 
+        markersize=2, 
+        linestyle='none', 
         color='white', 
         zorder=3
     )
     
-    # Plot the percentiles
-    ax.vlines(
-        inds, 
-        quartile1, quartile3, 
-        color='gray', 
-        linestyle='-', 
-        lw=3
-    )
-
-    # Plot the whiskers
-    ax.vlines(
-        inds, 
-        whiskers_min, 
-        whiskers_max, 
-        color='gray', 
-        linestyle='-', 
-        lw=.75
-    )
-
-    # Plot the median
-    ax.hlines(
-        medians, 
-        inds-7.5e-2, inds+7.5e-2, 
-        color='black', 
-        linestyle='-', 
-        lw=.5
+    # Plot the percentiles, the whiskers, and the median as one collection
+    n_inds = len(inds)
+    segments = np.empty((3 * n_inds, 2, 2))
+    segments[:n_inds, :, 0] = inds[:, None]
+    segments[:n_inds, 0, 1] = quartile1
+    segments[:n_inds, 1, 1] = quartile3
+    segments[n_inds:2*n_inds, :, 0] = inds[:, None]
+    segments[n_inds:2*n_inds, 0, 1] = whiskers_min
+    segments[n_inds:2*n_inds, 1, 1] = whiskers_max
+    segments[2*n_inds:, 0, 0] = inds - 7.5e-2
+    segments[2*n_inds:, 1, 0] = inds + 7.5e-2
+    segments[2*n_inds:, :, 1] = medians[:, None]
+    ax.add_collection(
+        LineCollection(
+            segments, 
+            colors=['gray'] * (2 * n_inds) + ['black'] * n_inds, 
+            linewidths=[3] * n_inds + [.75] * n_inds + [.5] * n_inds, 
+            linestyle='-'
+        )
     )
 
     # Plot the theoretical solution
@@ -506,17 +747,14 @@ def plot_covariance(cov:np.ndarray, output_file:str, theory=None):
 
     # Set the x-axis 
     ax.set_xticks(inds)
-    ax.set_xticklabels(labels)
+    ax.set_xticklabels(_COV_LABELS)
     ax.set_xlabel('$(i, j)$')
     
     # Set the y-axis
-    ax.set_ylabel('Covariance $\Sigma_{ij}$')
-    
-    # Apply the layout
-    fig.tight_layout()
+    ax.set_ylabel(r'Covariance $\Sigma_{ij}$')
     
     # Save the figure
-    fig.savefig(output_file)
+    _savefig(fig, output_file)
 
     return fig
 
@@ -556,14 +794,28 @@ def plot_conditional_correlation(Xgrids:np.ndarray or list, cond_corr:np.ndarray
         The figure.
     """
     # Set the style of the plot
-    plt.rcParams.update(MPL_CONFIG)
+    _ensure_rc()
 
     # If the input is an array
     if isinstance(Xgrids, list):
         n_data = len(Xgrids)
+
+        if Xrange is None:
+            Xmin, Xmax = _extrema(Xgrids)
+        else:
+            Xmin = [Xrange[i][0] for i in range(n_data)]
+            Xmax = [Xrange[i][1] for i in range(n_data)]
+
+        # Get the labels and supplementary functions in order
+        if isinstance(f_supplement, dict):
+            if len(f_supplement) != n_data:
+                raise ValueError(
+                    'The length of f_supplement must be the same as Xgrids if f_supplement is a dictionary.'
+                )
+            f_supplement_items = tuple(f_supplement.items())
         
         # Create a figure
-        fig, ax = plt.subplots(
+        fig, ax = _get_fig(
             nrows=1, 
             ncols=len(Xgrids), 
             figsize=(len(Xgrids)*2.5, 2.5)
@@ -573,21 +825,24 @@ def plot_conditional_correlation(Xgrids:np.ndarray or list, cond_corr:np.ndarray
         for i in range(len(Xgrids)):
             # Plot the conditional correlation
             if cond_corr[i].ndim > 1:
-                cond_corr_mean = np.nanmean(
-                    cond_corr[i], 
-                    axis=1
-                )
-                ax[i].scatter(
+                cond_corr_mean = nanmean(cond_corr[i])
+                ax[i].plot(
                     Xgrids[i], 
                     cond_corr_mean, 
-                    color='r'
+                    color='r',
+                    marker='o',
+                    linestyle='none',
+                    rasterized=True
                 )
             else:
-                ax[i].scatter(
+                ax[i].plot(
                     Xgrids[i], 
                     cond_corr[i], 
-                    edgecolor='r',
-                    facecolor='none'
+                    markeredgecolor='r',
+                    markerfacecolor='none',
+                    marker='o',
+                    linestyle='none',
+                    rasterized=True
                 )
                 # If std is True
                 if isinstance(std, list):
@@ -600,41 +855,37 @@ def plot_conditional_correlation(Xgrids:np.ndarray or list, cond_corr:np.ndarray
                         ecolor='r', 
                         elinewidth=1, 
                         capsize=2, 
-                        alpha=0.5
+                        alpha=0.5,
+                        rasterized=True
                     )
             
-            if Xrange is None:
-                Xmin = [np.min(Xgrids[i]) for i in range(n_data)]
-                Xmax = [np.max(Xgrids[i]) for i in range(n_data)]
-            else:
-                Xmin = [Xrange[i][0] for i in range(n_data)]
-                Xmax = [Xrange[i][1] for i in range(n_data)]
-            
             ax[i].set_xlim(
                 Xmin[i],
                 Xmax[i]
             )
 
             if theory is not None:
-                Ymin = [
-                    0.8 * min(np.nanmin(theory[i](Xgrids[i])), np.nanmin(cond_corr[i][(cond_corr[i] != -np.inf) & (Xgrids[i] >= Xmin[i]) & (Xgrids[i] <= Xmax[i])])) - 0.1
-                    for i in range(n_data)
-                ]
-                Ymax = [
-                    1.2 * max(np.nanmax(theory[i](Xgrids[i])), np.nanmax(cond_corr[i][(cond_corr[i] != np.inf) & (Xgrids[i] >= Xmin[i]) & (Xgrids[i] <= Xmax[i])])) + 0.1
-                    for i in range(n_data)
-                ]
+                # Evaluate the theoretical solution once
+                y_theory = theory[i](Xgrids[i])
+
+                # Select the plotted finite data within the x-range once for both bounds
+                y_data = cond_corr_mean if cond_corr[i].ndim > 1 else cond_corr[i]
+                y_data = y_data[(Xgrids[i] >= Xmin[i]) & (Xgrids[i] <= Xmax[i])]
+                y_data = y_data[np.isfinite(y_data)]
+
+                # Set the y-range from the theory and the data
+                Ymin = 0.8 * min(np.nanmin(y_theory), y_data.min()) - 0.1
+                Ymax = 1.2 * max(np.nanmax(y_theory), y_data.max()) + 0.1
             
                 ax[i].set_ylim(
-                    Ymin[i],
-                    Ymax[i]
+                    Ymin,
+                    Ymax
                 )
                 
-            if theory is not None:
                 # Plot the theoretical solution
                 ax[i].plot(
                     Xgrids[i], 
-                    theory[i](Xgrids[i]), 
+                    y_theory, 
                     'k--', 
                     label='no TI'
                 )
@@ -666,16 +917,13 @@ def plot_conditional_correlation(Xgrids:np.ndarray or list, cond_corr:np.ndarray
                         label='supplement'
                     )
                 elif isinstance(f_supplement, dict):
-                    if len(f_supplement) != len(Xgrids):
-                        raise ValueError(
-                            'The length of f_supplement must be the same as Xgrids if f_supplement is a dictionary.'
-                        )
+                    label, f = f_supplement_items[i]
                     # Plot the theoretical solution
                     ax[i].plot(
                         Xgrids[i], 
-                        f_supplement.values()[i](Xgrids[i]), 
+                        f(Xgrids[i]), 
                         'k-.', 
-                        label=f_supplement.keys()[i]
+                        label=label
                     )
 
             if threshold is not None:
@@ -698,21 +946,29 @@ def plot_conditional_correlation(Xgrids:np.ndarray or list, cond_corr:np.ndarray
         
     else:
         # Create a figure
-        fig, ax = plt.subplots()
+        fig, ax = _get_fig()
 
         if Xrange is None:
-            Xmin = np.min(Xgrids)
-            Xmax = np.max(Xgrids)
+            Xmin, Xmax = Xgrids.min(), Xgrids.max()
         else:
             Xmin = Xrange[0]
             Xmax = Xrange[1]
         
+        # Average over samples if given
+        if cond_corr.ndim > 1:
+            cond_corr_mean = nanmean(cond_corr)
+        else:
+            cond_corr_mean = cond_corr
+
         if std is False:
-            ax.scatter(
+            ax.plot(
                 Xgrids, 
-                cond_corr, 
-                edgecolor='r',
-                facecolor='none'
+                cond_corr_mean, 
+                markeredgecolor='r',
+                markerfacecolor='none',
+                marker='o',
+                linestyle='none',
+                rasterized=True
             )
         else:
             ax.errorbar(
@@ -724,7 +980,8 @@ def plot_conditional_correlation(Xgrids:np.ndarray or list, cond_corr:np.ndarray
                 ecolor='r', 
                 elinewidth=1, 
                 capsize=2, 
-                alpha=0.5
+                alpha=0.5,
+                rasterized=True
             )
         
         
@@ -756,15 +1013,128 @@ def plot_conditional_correlation(Xgrids:np.ndarray or list, cond_corr:np.ndarray
                 threshold, linestyle=':', color='k'
             )
 
-    # Apply the layout
-    fig.tight_layout()
-
     # Save the figure
-    fig.savefig(output_file)
+    _savefig(fig, output_file)
     
     return fig
 
-def plot_conditional_mutual_information(Xgrids:np.ndarray or list, cmi:np.ndarray or list, order:tuple or list, output_file:str, std:bool or list=False, Xrange:tuple or list=None, theory=None):
+# Translation of digits to Unicode subscripts
+_SUBSCRIPTS = str.maketrans('0123456789', '₀₁₂₃₄₅₆₇₈₉')
+
+@functools.lru_cache(maxsize=64)
+def _cmi_labels(order:tuple, use_mathtext:bool=True):
+    """Get the axis labels of the conditional mutual information plot.
+
+    Parameters
+    ----------
+    order : tuple
+        The order of the nodes.
+    use_mathtext : bool, optional
+         (Default value = True)
+        If False, use plain text with Unicode subscripts instead of mathtext.
+
+    Returns
+    -------
+    xlabel : str
+        The label of the x-axis.
+    ylabel : str
+        The label of the y-axis.
+    """
+    if not use_mathtext:
+        i, j, k = ('%d' % n for n in order[:3])
+        xlabel = ('X' + k).translate(_SUBSCRIPTS)
+        ylabel = ('I(X%s; X%s | X%s)' % (i, j, k)).translate(_SUBSCRIPTS)
+        return xlabel, ylabel
+
+    xlabel = r'$X_{%d}$' % (order[2])
+    ylabel = r'$I(X_{%d}; X_{%d} \mid X_{%d})$' % (order[0], order[1], order[2])
+    return xlabel, ylabel
+
+def _draw_conditional_mutual_information(ax, Xgrid:np.ndarray, cmi:np.ndarray, order:tuple, Xmin:float, Xmax:float, std:bool=False, theory=None, use_mathtext:bool=True, clip:bool=False):
+    """Draw the conditional mutual information on the given axes.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes.Axes
+        The axes.
+    Xgrid : numpy.ndarray of shape (n_bins,)
+        The grid of the conditional variable.
+    cmi : numpy.ndarray of shape (n_bins,) or (n_bins, n_samples)
+        The conditional mutual information.
+    order : tuple
+        The order of the nodes.
+    Xmin : float
+        The minimum of the x-axis.
+    Xmax : float
+        The maximum of the x-axis.
+    std : bool, optional
+         (default = False)
+        If True, plot the standard error.
+    theory : function, optional
+         (Default value = None)
+        The theoretical solution.
+    use_mathtext : bool, optional
+         (Default value = True)
+        If False, use plain text labels with Unicode subscripts.
+    clip : bool, optional
+         (Default value = False)
+        If True, plot the theoretical solution, and 1-D data, only within the x-range,
+        so that the y-axis is autoscaled to the points within the x-range.
+    """
+    # Set the labels and fix the x-range before adding artists to skip x-autoscaling
+    xlabel, ylabel = _cmi_labels(tuple(order), use_mathtext)
+    ax.set(
+        xlabel=xlabel, 
+        ylabel=ylabel, 
+        xlim=(Xmin, Xmax)
+    )
+
+    # View the conditional mutual information as an array of shape (n_bins, n_samples)
+    cmi2d = cmi[:, None] if cmi.ndim == 1 else cmi
+
+    # Select the grid points within the range if clipping, otherwise all grid points
+    in_range = (Xgrid >= Xmin) & (Xgrid <= Xmax) if clip else slice(None)
+    data_range = in_range if cmi.ndim == 1 else slice(None)
+
+    # Compute the mean and standard deviation over samples
+    cmi_mean, cmi_std = mean_std(cmi2d[data_range])
+    ax.plot(
+        Xgrid[data_range], 
+        cmi_mean, 
+        markeredgecolor='r',
+        markerfacecolor='none',
+        marker='o',
+        linestyle='none',
+        rasterized=True
+    )
+    # If std is True
+    if std and cmi2d.shape[1] > 1:
+        # Plot the standard deviation
+        ax.errorbar(
+            Xgrid[data_range], 
+            cmi_mean, 
+            yerr=cmi_std / np.sqrt(cmi2d.shape[1]), 
+            fmt='none', 
+            color='r', 
+            ecolor='r', 
+            elinewidth=1, 
+            capsize=2, 
+            alpha=0.5,
+            rasterized=True
+        )
+    
+    if theory is not None:
+        # Plot the theoretical solution
+        ax.plot(
+            Xgrid[in_range], 
+            theory(Xgrid[in_range]), 
+            'k--', 
+            label='no TI'
+        )
+        # Set the legend
+        ax.legend()
+
+def plot_conditional_mutual_information(Xgrids:np.ndarray or list, cmi:np.ndarray or list, order:tuple or list, output_file:str, std:bool or list=False, Xrange:tuple or list=None, theory=None, use_mathtext:bool=True):
     """Plot conditional mutual information.
     
     Parameter
@@ -787,6 +1157,10 @@ def plot_conditional_mutual_information(Xgrids:np.ndarray or list, cmi:np.ndarra
     theory : function or list of functions, optional
             (Default value = None)
         The theoretical solutions.
+    use_mathtext : bool, optional
+            (Default value = True)
+        If False, format the labels as plain text with Unicode subscripts,
+        which skips the mathtext parser, e.g. for raster output.
 
     Returns
     -------
@@ -794,21 +1168,20 @@ def plot_conditional_mutual_information(Xgrids:np.ndarray or list, cmi:np.ndarra
         The figure.
     """
     # Set the style of the plot
-    plt.rcParams.update(MPL_CONFIG)
+    _ensure_rc()
 
     # If the input is an array
     if isinstance(Xgrids, list):
         n_data = len(Xgrids)
 
         if Xrange is None:
-            Xmin = [np.min(Xgrids[i]) for i in range(n_data)]
-            Xmax = [np.max(Xgrids[i]) for i in range(n_data)]
+            Xmin, Xmax = _extrema(Xgrids)
         else:
             Xmin = [Xrange[i][0] for i in range(n_data)]
             Xmax = [Xrange[i][1] for i in range(n_data)]
         
         # Create a figure
-        fig, ax = plt.subplots(
+        fig, ax = _get_fig(
             nrows=1, 
             ncols=len(Xgrids), 
             figsize=(len(Xgrids)*2.5, 2.5)
@@ -816,112 +1189,44 @@ def plot_conditional_mutual_information(Xgrids:np.ndarray or list, cmi:np.ndarra
 
         # Plot the conditional mutual information
         for i in range(len(Xgrids)):
-            if cmi[i].ndim > 1:
-                cmi_mean = np.mean(
-                    cmi[i], 
-                    axis=1
-                )
-                ax[i].scatter(
-                    Xgrids[i], 
-                    cmi_mean, 
-                    edgecolor='r',
-                    facecolor='none'
-                )
-                # If std is True
-                if std:
-                    # Plot the standard deviation
-                    cmi_std = np.std(
-                        cmi[i], 
-                        axis=1
-                    )
-                    ax[i].errorbar(
-                        Xgrids[i], 
-                        cmi_mean, 
-                        yerr=cmi_std / np.sqrt(cmi[i].shape[1]), 
-                        fmt='none', 
-                        color='r', 
-                        ecolor='r', 
-                        elinewidth=1, 
-                        capsize=2, 
-                        alpha=0.5
-                    )
-            else:
-                ax[i].scatter(
-                    Xgrids[i][(Xgrids[i] >= Xmin[i]) & (Xgrids[i] <= Xmax[i])], 
-                    cmi[i][(Xgrids[i] >= Xmin[i]) & (Xgrids[i] <= Xmax[i])], 
-                    edgecolor='r',
-                    facecolor='none'
-                )
-            
-            if theory is not None:
-                # Plot the theoretical solution
-                ax[i].plot(
-                    Xgrids[i][(Xgrids[i] >= Xmin[i]) & (Xgrids[i] <= Xmax[i])], 
-                    theory[i](Xgrids[i][(Xgrids[i] >= Xmin[i]) & (Xgrids[i] <= Xmax[i])]), 
-                    'k--', 
-                    label='no TI'
-                )
-                # Set the legend
-                ax[i].legend()
-
-            ax[i].set_xlim(
-                Xmin[i],
-                Xmax[i]
-            )
-            
-            # Set the labels
-            ax[i].set_xlabel(
-                r'$X_{%d}$' % (order[i][2])
-            )
-            ax[i].set_ylabel(
-                r'$I(X_{%d}; X_{%d} \mid X_{%d})$' % (
-                    order[i][0], order[i][1], order[i][2]
-                )
+            _draw_conditional_mutual_information(
+                ax[i], 
+                Xgrids[i], 
+                cmi[i], 
+                order[i], 
+                Xmin[i], 
+                Xmax[i], 
+                std=std, 
+                theory=theory[i] if theory is not None else None, 
+                use_mathtext=use_mathtext, 
+                clip=True
             )
         
     else:
         if Xrange is None:
-            Xmin = np.min(Xgrids)
-            Xmax = np.max(Xgrids)
+            Xmin, Xmax = Xgrids.min(), Xgrids.max()
         else:
             Xmin = Xrange[0]
             Xmax = Xrange[1]
 
         # Create a figure
-        fig, ax = plt.subplots()
-        
-        ax.scatter(
+        fig, ax = _get_fig()
+
+        # Plot the conditional mutual information
+        _draw_conditional_mutual_information(
+            ax, 
             Xgrids, 
             cmi, 
-            edgecolor='r',
-            facecolor='none'
+            order, 
+            Xmin, 
+            Xmax, 
+            std=std, 
+            theory=theory, 
+            use_mathtext=use_mathtext
         )
-        if theory is not None:
-            # Plot the theoretical solution
-            ax.plot(
-                Xgrids, 
-                theory(Xgrids), 
-                'k--', 
-                label='no TI'
-            )
-            # Set the legend
-            ax.legend()
-        
-        ax.set_xlim(
-            Xmin,
-            Xmax
-        )
-        
-        # Set the labels
-        ax.set_xlabel(
-            r'$X_{%d}$' % (order[2])
-        )
-
-    # Apply the layout
-    fig.tight_layout()
 
     # Save the figure
-    fig.savefig(output_file)
+    _savefig(fig, output_file)
     
     return fig
 